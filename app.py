@@ -1,37 +1,495 @@
 import os
 import logging
-from flask import Flask, request, jsonify, render_template, flash, redirect, url_for
-from flask_limiter import Limiter
+import hashlib
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import wraps
+import jwt
+import msgspec
+import orjson
+import redis
+from cachetools import TTLCache
+from flask import Flask, Response, g, request, jsonify, render_template, flash, redirect, url_for, abort, stream_with_context
+from flask.json.provider import JSONProvider, DefaultJSONProvider
+from flask_caching import Cache
+from flask_limiter import Limiter, ExemptionScope
 from flask_limiter.util import get_remote_address
 from utils.decoder import ClassPlusDecoder
 from utils.classplus_client import ClassPlusClient
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "classplus-decoder-secret-key")
 
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson for faster request parsing and jsonify"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
+def json_response(payload, status=200):
+    """Serialize payload straight to a response, skipping jsonify"""
+    return Response(
+        orjson.dumps(payload, default=DefaultJSONProvider.default),
+        status=status,
+        mimetype="application/json"
+    )
+
+def ndjson_line(payload):
+    """Serialize payload as one newline-terminated JSON line"""
+    return orjson.dumps(payload, default=DefaultJSONProvider.default) + b"\n"
+
+# Request payload schemas, decoded straight from the request body
+class DecodeRequest(msgspec.Struct):
+    token: str | None = None
+    encrypted_url: str | None = None
+    video_id: str | int | None = None
+
+class BatchUrl(msgspec.Struct):
+    encrypted_url: str | None = None
+    video_id: str | int | None = None
+
+class BatchDecodeRequest(msgspec.Struct):
+    token: str | None = None
+    urls: list[BatchUrl] = []
+
+class ValidateTokenRequest(msgspec.Struct):
+    token: str | None = None
+
+def parse_payload(payload_type):
+    """
+    Decode the request body into payload_type, returning (payload, error_response).
+    
+    The result is kept on g so the rate limit key and the view share one parse.
+    """
+    if "payload" not in g:
+        try:
+            g.payload, g.payload_error = msgspec.json.decode(request.get_data(), type=payload_type), None
+        except msgspec.ValidationError as e:
+            g.payload, g.payload_error = None, (jsonify({
+                "error": str(e),
+                "code": "INVALID_PAYLOAD"
+            }), 400)
+        except msgspec.DecodeError:
+            g.payload, g.payload_error = None, (jsonify({
+                "error": "Invalid JSON payload",
+                "code": "INVALID_JSON"
+            }), 400)
+    return g.payload, g.payload_error
+
+# Payload type for each JSON endpoint, used to parse the body before the view runs
+PAYLOAD_TYPES = {
+    "decode_video_url": DecodeRequest,
+    "batch_decode_urls": BatchDecodeRequest,
+    "validate_token": ValidateTokenRequest
+}
+
+# Connect to Redis for shared state across workers
+REDIS_URL = os.environ.get("REDIS_URL")
+
+def connect_redis():
+    """Return a Redis client, or None if Redis is not configured or unreachable"""
+    if not REDIS_URL:
+        logger.warning("REDIS_URL not set, falling back to in-memory storage")
+        return None
+    try:
+        client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1)
+        client.ping()
+        return client
+    except redis.RedisError as e:
+        logger.warning("Redis unavailable, falling back to in-memory storage: %s", e)
+        return None
+
+redis_client = connect_redis()
+
+def ckey(*parts):
+    """16-byte blake2b digest of parts, the canonical cache and rate limit key"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else part
+        # Length-prefix each part so no two different part lists hash the same bytes
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.digest()
+
+# Response cache, shared across workers when Redis is available
+response_cache = Cache(app, config={
+    "CACHE_TYPE": "RedisCache",
+    "CACHE_REDIS_URL": REDIS_URL
+} if redis_client else {
+    "CACHE_TYPE": "SimpleCache"
+})
+
+def token_key():
+    """
+    Rate limit key derived from a hash of the request token.
+    
+    A token is limited across IPs. Falls back to the client IP when there is
+    no token, prefixed so it doesn't share a bucket with a stacked per-IP limit.
+    Tokens are client-chosen and unvalidated at this point, so views also keep
+    a looser per-IP ceiling (IP_LIMIT_MULTIPLIER times the token limit) that
+    users behind one NAT or proxy IP share, to stop one client rotating tokens.
+    """
+    payload_type = PAYLOAD_TYPES.get(request.endpoint)
+    if payload_type:
+        payload, _ = parse_payload(payload_type)
+        token = payload.token if payload else None
+    else:
+        token = request.args.get('token')
+    if not token:
+        return f"ip:{get_remote_address()}"
+    return ckey(str(token)).hex()
+
+# The per-IP ceiling stacked on each per-token limit, as a multiple of it
+IP_LIMIT_MULTIPLIER = int(os.environ.get("IP_LIMIT_MULTIPLIER", "5"))
+
 # Configure rate limiting
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
+    default_limits=["200 per day", "50 per hour"],
+    storage_uri=REDIS_URL if redis_client else "memory://",
+    storage_options={"socket_connect_timeout": 1},
+    strategy="moving-window",
+    # Degrade to per-process limits if Redis goes away, like the custom limiters
+    swallow_errors=True,
+    in_memory_fallback_enabled=True
 )
 limiter.init_app(app)
 
+# Sliding-window limiter: prune, count, admit and expire in one atomic round-trip
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+if redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, window)
+    return 1
+end
+return 0
+"""
+
+sliding_window_sha = redis_client.script_load(SLIDING_WINDOW_LUA) if redis_client else None
+
+def check_sliding_window(key, limit, window_ms):
+    """Record a hit against key and return True if it is within the limit"""
+    global sliding_window_sha
+    args = (int(time.time() * 1000), window_ms, limit, uuid.uuid4().hex)
+    try:
+        try:
+            return bool(redis_client.evalsha(sliding_window_sha, 1, key, *args))
+        except redis.exceptions.NoScriptError:
+            # Script cache was flushed (e.g. Redis restart), load it again
+            sliding_window_sha = redis_client.script_load(SLIDING_WINDOW_LUA)
+            return bool(redis_client.evalsha(sliding_window_sha, 1, key, *args))
+    except redis.RedisError as e:
+        logger.warning("Rate limit check failed, allowing request: %s", e)
+        return True
+
+def sliding_window_limit(limit, window_seconds, key_func=get_remote_address):
+    """
+    Rate limit a view with the Redis Lua sliding window.
+    
+    Falls back to Flask-Limiter when Redis is unavailable.
+    """
+    def decorator(f):
+        if not redis_client:
+            return limiter.limit(f"{limit} per {window_seconds} seconds", key_func=key_func)(f)
+        
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = f"rl:{f.__name__}:{key_func()}"
+            if not check_sliding_window(key, limit, window_seconds * 1000):
+                abort(429, description=f"{limit} per {window_seconds} seconds")
+            return f(*args, **kwargs)
+        # This limit replaces the Flask-Limiter defaults, which would otherwise
+        # add their own Redis checks to every request
+        return limiter.exempt(wrapper, flags=ExemptionScope.DEFAULT)
+    return decorator
+
+# Two-tier limiter: each process leases a batch of grants from a shared Redis
+# counter and hands them out locally, so Redis is hit once per lease rather
+# than once per request. Once the shared window is used up, every process
+# refuses locally until the window expires.
+LOCAL_BUCKET_LEASES = 10
+
+LEASE_GRANTS_LUA = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+local granted = math.min(tonumber(ARGV[2]), tonumber(ARGV[1]) - count)
+if granted > 0 then
+    redis.call('INCRBY', KEYS[1], granted)
+    if redis.call('PTTL', KEYS[1]) < 0 then
+        redis.call('PEXPIRE', KEYS[1], ARGV[3])
+    end
+else
+    granted = 0
+end
+return {granted, redis.call('PTTL', KEYS[1])}
+"""
+
+lease_grants_sha = redis_client.script_load(LEASE_GRANTS_LUA) if redis_client else None
+
+class LocalBucket:
+    """Per-process grants for one (endpoint, key) pair"""
+    
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.expires = 0.0
+        self.exhausted = False
+        self.lock = threading.Lock()
+    
+    def consume(self):
+        """Take one token from the refilling bucket, used when there is no Redis"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+            self.updated = now
+            
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+    
+    def acquire(self):
+        """Take one leased grant, returning True, False if the shared window is used up, or None if a lease is needed"""
+        with self.lock:
+            if time.monotonic() >= self.expires:
+                # Leases only count against the window they were taken in
+                self.tokens, self.exhausted = 0, False
+                return None
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False if self.exhausted else None
+    
+    def add_lease(self, granted, ttl_ms):
+        """Record grants leased from the shared counter and when its window ends"""
+        with self.lock:
+            self.tokens += granted
+            self.exhausted = granted == 0
+            self.expires = time.monotonic() + ttl_ms / 1000
+
+local_buckets_lock = threading.Lock()
+local_buckets = TTLCache(maxsize=10000, ttl=3600)
+
+def lease_shared_grants(key, limit, lease_size, window_ms):
+    """Lease up to lease_size grants from the shared counter, returning (granted, ttl_ms) or None on failure"""
+    global lease_grants_sha
+    args = (limit, lease_size, window_ms)
+    try:
+        try:
+            granted, ttl_ms = redis_client.evalsha(lease_grants_sha, 1, key, *args)
+        except redis.exceptions.NoScriptError:
+            lease_grants_sha = redis_client.script_load(LEASE_GRANTS_LUA)
+            granted, ttl_ms = redis_client.evalsha(lease_grants_sha, 1, key, *args)
+    except redis.RedisError as e:
+        logger.warning("Shared rate limit lease failed, allowing request: %s", e)
+        return None
+    ttl_ms = int(ttl_ms)
+    return int(granted), ttl_ms if ttl_ms > 0 else window_ms
+
+def local_bucket_limit(limit, window_seconds, key_func=get_remote_address):
+    """Rate limit a view with grants leased from Redis, or a local token bucket without Redis"""
+    lease_size = max(1, limit // LOCAL_BUCKET_LEASES)
+    
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = f"lb:{f.__name__}:{key_func()}"
+            
+            with local_buckets_lock:
+                bucket = local_buckets.get(key)
+                if bucket is None:
+                    bucket = local_buckets[key] = LocalBucket(limit, limit / window_seconds)
+            
+            if not redis_client:
+                allowed = bucket.consume()
+            else:
+                allowed = bucket.acquire()
+                if allowed is None:
+                    lease = lease_shared_grants(key, limit, lease_size, window_seconds * 1000)
+                    if lease is None:
+                        allowed = True
+                    else:
+                        bucket.add_lease(*lease)
+                        allowed = bucket.acquire() is True
+            
+            if not allowed:
+                abort(429, description=f"{limit} per {window_seconds} seconds")
+            return f(*args, **kwargs)
+        # This limit replaces the Flask-Limiter defaults, which would otherwise
+        # add their own checks to every request
+        return limiter.exempt(wrapper, flags=ExemptionScope.DEFAULT)
+    return decorator
+
 # Initialize decoder and client
 decoder = ClassPlusDecoder()
 classplus_client = ClassPlusClient()
 
+# Cap concurrent upstream calls so we don't trigger ClassPlus rate limits.
+# One pool per process bounds the total across all in-flight batches.
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "16"))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="batch-decode")
+
+# Bound each batch so one large request can't queue ahead of everyone else's
+BATCH_MAX_URLS = int(os.environ.get("BATCH_MAX_URLS", "100"))
+BATCH_REQUEST_CONCURRENCY = int(os.environ.get("BATCH_REQUEST_CONCURRENCY", "4"))
+
+# Cache token lookups so repeated tokens skip the ClassPlus round-trip.
+# Keys are token hashes, raw tokens are never stored.
+token_cache_lock = threading.RLock()
+token_caches = {
+    "validate_token": TTLCache(maxsize=10000, ttl=60),
+    "token_info": TTLCache(maxsize=10000, ttl=60)
+}
+token_cache_stats = {name: {"hits": 0, "misses": 0} for name in token_caches}
+_MISSING = object()
+
+def cached_token_call(name, func, token):
+    """Return func(token) from the named TTL cache, calling upstream on a miss"""
+    cache = token_caches[name]
+    key = ckey(token)
+    
+    with token_cache_lock:
+        result = cache.get(key, _MISSING)
+        if result is not _MISSING:
+            token_cache_stats[name]["hits"] += 1
+            return result
+        token_cache_stats[name]["misses"] += 1
+    
+    # Call upstream without holding the lock so other tokens aren't blocked
+    result = func(token)
+    
+    with token_cache_lock:
+        cache[key] = result
+    return result
+
+def validate_token_cached(token):
+    """Cached classplus_client.validate_token"""
+    return cached_token_call("validate_token", classplus_client.validate_token, token)
+
+def get_token_info_cached(token):
+    """Cached classplus_client.get_token_info"""
+    return cached_token_call("token_info", classplus_client.get_token_info, token)
+
+# Verify ClassPlus JWTs locally when a JWKS endpoint is configured.
+# The key set is fetched at most once per JWKS_REFRESH_INTERVAL, so tokens
+# with unknown key IDs can't force an outbound fetch on every request.
+CLASSPLUS_JWKS_URL = os.environ.get("CLASSPLUS_JWKS_URL")
+CLASSPLUS_JWT_ALGORITHMS = os.environ.get("CLASSPLUS_JWT_ALGORITHMS", "RS256").split(",")
+TOKEN_EXPIRY_MARGIN = 30
+JWKS_REFRESH_INTERVAL = 300
+
+jwks_client = jwt.PyJWKClient(CLASSPLUS_JWKS_URL) if CLASSPLUS_JWKS_URL else None
+jwks_lock = threading.Lock()
+jwks_keys = {}
+jwks_fetched_at = float("-inf")
+
+def jwks_signing_key(kid):
+    """Return the cached signing key for kid, or None if it isn't known"""
+    global jwks_keys, jwks_fetched_at
+    
+    with jwks_lock:
+        refresh = time.monotonic() - jwks_fetched_at >= JWKS_REFRESH_INTERVAL
+        if refresh:
+            jwks_fetched_at = time.monotonic()
+    
+    if refresh:
+        try:
+            jwks_keys = {key.key_id: key for key in jwks_client.get_signing_keys(refresh=True)}
+        except jwt.PyJWTError as e:
+            logger.warning("JWKS fetch failed, keeping cached keys: %s", e)
+    
+    return jwks_keys.get(kid)
+
+def token_valid_locally(token):
+    """Return True if token is a signed JWT that won't expire for TOKEN_EXPIRY_MARGIN seconds"""
+    if not jwks_client:
+        return False
+    try:
+        # Check expiry before spending time on signature verification
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        if not isinstance(exp, (int, float)) or exp <= time.time() + TOKEN_EXPIRY_MARGIN:
+            return False
+        
+        # Unknown key IDs are inconclusive, not a reason to refetch the key set
+        kid = jwt.get_unverified_header(token).get("kid")
+        signing_key = jwks_signing_key(kid) if kid else None
+        if signing_key is None:
+            return False
+        
+        jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=CLASSPLUS_JWT_ALGORITHMS,
+            options={"verify_aud": False}
+        )
+        return True
+    except jwt.PyJWTError:
+        return False
+
+def is_token_valid(token):
+    """Validate token locally when conclusive, otherwise fall back to the cached ClassPlus check"""
+    return token_valid_locally(token) or validate_token_cached(token)
+
+# Decoded URLs are deterministic per (token, encrypted_url). Entries are only
+# read after the token has been validated, so revoked tokens never hit the cache.
+DECODE_CACHE_TTL = int(os.environ.get("DECODE_CACHE_TTL", "300"))
+
+def decode_url_cached(encrypted_url, token):
+    """decoder.decode_url backed by a Redis cache when Redis is available"""
+    if not redis_client:
+        return decoder.decode_url(encrypted_url, token)
+    
+    key = "dec:" + ckey(token, encrypted_url).hex()
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            return cached.decode()
+    except redis.RedisError as e:
+        logger.warning("Decode cache read failed: %s", e)
+    
+    decoded_url = decoder.decode_url(encrypted_url, token)
+    
+    if decoded_url:
+        try:
+            redis_client.setex(key, DECODE_CACHE_TTL, decoded_url)
+        except redis.RedisError as e:
+            logger.warning("Decode cache write failed: %s", e)
+    return decoded_url
+
+# Cache the compiled landing page template, not its output: templates can read
+# session, g and flashed messages, which differ per visitor
+index_template = None
+
 @app.route('/')
 def index():
     """Main page with API testing interface"""
-    return render_template('index.html')
+    global index_template
+    # Reload in debug mode so template edits show up
+    if index_template is None or app.debug:
+        index_template = app.jinja_env.get_template('index.html')
+    return render_template(index_template)
 
 @app.route('/api/decode', methods=['POST'])
-@limiter.limit("10 per minute")
+@sliding_window_limit(10 * IP_LIMIT_MULTIPLIER, 60)
+@sliding_window_limit(10, 60, key_func=token_key)
 def decode_video_url():
     """
     Decode ClassPlus encrypted video URL
@@ -44,17 +502,14 @@ def decode_video_url():
     }
     """
     try:
-        data = request.get_json()
+        payload, error = parse_payload(DecodeRequest)
         
-        if not data:
-            return jsonify({
-                "error": "Invalid JSON payload",
-                "code": "INVALID_JSON"
-            }), 400
+        if error:
+            return error
         
-        token = data.get('token')
-        encrypted_url = data.get('encrypted_url')
-        video_id = data.get('video_id')
+        token = payload.token
+        encrypted_url = payload.encrypted_url
+        video_id = payload.video_id
         
         # Validate required fields
         if not token:
@@ -69,17 +524,17 @@ def decode_video_url():
                 "code": "MISSING_URL"
             }), 400
         
-        logger.info(f"Decoding request for video_id: {video_id}")
+        logger.info("Decoding request for video_id: %s", video_id)
         
         # Validate token with ClassPlus
-        if not classplus_client.validate_token(token):
+        if not validate_token_cached(token):
             return jsonify({
                 "error": "Invalid or expired token",
                 "code": "INVALID_TOKEN"
             }), 401
         
         # Decode the encrypted URL
-        decoded_url = decoder.decode_url(encrypted_url, token)
+        decoded_url = decode_url_cached(encrypted_url, token)
         
         if not decoded_url:
             return jsonify({
@@ -98,11 +553,11 @@ def decode_video_url():
             "video_id": video_id
         }
         
-        logger.info(f"Successfully decoded URL for video_id: {video_id}")
-        return jsonify(response_data)
+        logger.info("Successfully decoded URL for video_id: %s", video_id)
+        return json_response(response_data)
         
     except Exception as e:
-        logger.error(f"Error decoding video URL: {str(e)}")
+        logger.error("Error decoding video URL: %s", e)
         return jsonify({
             "error": "Internal server error",
             "code": "INTERNAL_ERROR",
@@ -110,7 +565,8 @@ def decode_video_url():
         }), 500
 
 @app.route('/api/batch-decode', methods=['POST'])
-@limiter.limit("5 per minute")
+@sliding_window_limit(5 * IP_LIMIT_MULTIPLIER, 60)
+@sliding_window_limit(5, 60, key_func=token_key)
 def batch_decode_urls():
     """
     Batch decode multiple ClassPlus encrypted video URLs
@@ -125,18 +581,19 @@ def batch_decode_urls():
             }
         ]
     }
+    
+    Responds with NDJSON: one result per line as each URL finishes,
+    followed by a summary line. If the stream fails partway, the last line
+    has success false and code INTERNAL_ERROR instead.
     """
     try:
-        data = request.get_json()
+        payload, error = parse_payload(BatchDecodeRequest)
         
-        if not data:
-            return jsonify({
-                "error": "Invalid JSON payload",
-                "code": "INVALID_JSON"
-            }), 400
+        if error:
+            return error
         
-        token = data.get('token')
-        urls = data.get('urls', [])
+        token = payload.token
+        urls = payload.urls
         
         if not token:
             return jsonify({
@@ -144,68 +601,120 @@ def batch_decode_urls():
                 "code": "MISSING_TOKEN"
             }), 400
         
-        if not urls or not isinstance(urls, list):
+        if not urls:
             return jsonify({
                 "error": "URLs array is required",
                 "code": "MISSING_URLS"
             }), 400
         
+        if len(urls) > BATCH_MAX_URLS:
+            return jsonify({
+                "error": f"At most {BATCH_MAX_URLS} URLs per batch",
+                "code": "TOO_MANY_URLS"
+            }), 400
+        
         # Validate token
-        if not classplus_client.validate_token(token):
+        if not validate_token_cached(token):
             return jsonify({
                 "error": "Invalid or expired token",
                 "code": "INVALID_TOKEN"
             }), 401
         
-        results = []
-        
-        for url_data in urls:
+        def decode_one(encrypted_url):
             try:
-                encrypted_url = url_data.get('encrypted_url')
-                video_id = url_data.get('video_id')
-                
-                if not encrypted_url:
-                    results.append({
-                        "video_id": video_id,
-                        "success": False,
-                        "error": "Missing encrypted_url"
-                    })
-                    continue
-                
-                decoded_url = decoder.decode_url(encrypted_url, token)
+                decoded_url = decode_url_cached(encrypted_url, token)
                 
                 if decoded_url:
                     playable_url = decoder.generate_playable_url(decoded_url, token)
-                    results.append({
-                        "video_id": video_id,
+                    return {
                         "success": True,
                         "video_url": playable_url,
                         "decoded_url": decoded_url
-                    })
+                    }
                 else:
-                    results.append({
-                        "video_id": video_id,
+                    return {
                         "success": False,
                         "error": "Failed to decode URL"
-                    })
+                    }
                     
             except Exception as e:
-                results.append({
-                    "video_id": url_data.get('video_id'),
+                return {
                     "success": False,
                     "error": str(e)
+                }
+        
+        # Map each distinct URL to the entries that requested it so it is decoded once
+        positions = {}
+        for index, url_data in enumerate(urls):
+            encrypted_url = url_data.encrypted_url
+            if encrypted_url:
+                positions.setdefault(encrypted_url, []).append(index)
+        
+        def generate():
+            successful = 0
+            queued = iter(positions)
+            futures = {}
+            
+            try:
+                for index, url_data in enumerate(urls):
+                    if not url_data.encrypted_url:
+                        yield ndjson_line({
+                            "index": index,
+                            "video_id": url_data.video_id,
+                            "success": False,
+                            "error": "Missing encrypted_url"
+                        })
+                
+                # Keep at most BATCH_REQUEST_CONCURRENCY decodes of this batch in the
+                # shared pool, and stream results as each finishes, not in request order
+                while True:
+                    while len(futures) < BATCH_REQUEST_CONCURRENCY:
+                        encrypted_url = next(queued, None)
+                        if encrypted_url is None:
+                            break
+                        futures[batch_executor.submit(decode_one, encrypted_url)] = encrypted_url
+                    
+                    if not futures:
+                        break
+                    
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        
+                        for index in positions[futures.pop(future)]:
+                            if result["success"]:
+                                successful += 1
+                            yield ndjson_line({
+                                "index": index,
+                                "video_id": urls[index].video_id,
+                                **result
+                            })
+                
+                yield ndjson_line({
+                    "success": True,
+                    "done": True,
+                    "total": len(urls),
+                    "successful": successful,
+                    "timestamp": decoder.get_timestamp()
                 })
+            except Exception as e:
+                # Headers are already sent, so mark the stream as cut short
+                logger.error("Error while streaming batch decode: %s", e)
+                yield ndjson_line({
+                    "success": False,
+                    "done": True,
+                    "code": "INTERNAL_ERROR",
+                    "error": "Internal server error"
+                })
+            finally:
+                # Drop decodes that haven't started if we stopped early
+                for future in futures:
+                    future.cancel()
         
-        return jsonify({
-            "success": True,
-            "results": results,
-            "total": len(urls),
-            "successful": len([r for r in results if r.get('success')]),
-            "timestamp": decoder.get_timestamp()
-        })
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
         
     except Exception as e:
-        logger.error(f"Error in batch decode: {str(e)}")
+        logger.error("Error in batch decode: %s", e)
         return jsonify({
             "error": "Internal server error",
             "code": "INTERNAL_ERROR",
@@ -213,19 +722,17 @@ def batch_decode_urls():
         }), 500
 
 @app.route('/api/validate-token', methods=['POST'])
-@limiter.limit("20 per minute")
+@limiter.limit(f"{20 * IP_LIMIT_MULTIPLIER} per minute")
+@limiter.limit("20 per minute", key_func=token_key)
 def validate_token():
     """Validate ClassPlus token"""
     try:
-        data = request.get_json()
+        payload, error = parse_payload(ValidateTokenRequest)
         
-        if not data:
-            return jsonify({
-                "error": "Invalid JSON payload",
-                "code": "INVALID_JSON"
-            }), 400
+        if error:
+            return error
         
-        token = data.get('token')
+        token = payload.token
         
         if not token:
             return jsonify({
@@ -233,10 +740,10 @@ def validate_token():
                 "code": "MISSING_TOKEN"
             }), 400
         
-        is_valid = classplus_client.validate_token(token)
+        is_valid = validate_token_cached(token)
         
         if is_valid:
-            token_info = classplus_client.get_token_info(token)
+            token_info = get_token_info_cached(token)
             return jsonify({
                 "valid": True,
                 "token_info": token_info,
@@ -250,15 +757,26 @@ def validate_token():
             }), 401
             
     except Exception as e:
-        logger.error(f"Error validating token: {str(e)}")
+        logger.error("Error validating token: %s", e)
         return jsonify({
             "error": "Internal server error",
             "code": "INTERNAL_ERROR",
             "details": str(e) if app.debug else None
         }), 500
 
+def simple_decode_cache_key(*args, **kwargs):
+    """Response cache key for GET /api, one entry per (url, token)"""
+    return "api:" + ckey(request.args.get('url', ''), request.args.get('token', '')).hex()
+
 @app.route('/api', methods=['GET'])
-@limiter.limit("20 per minute")
+@local_bucket_limit(20 * IP_LIMIT_MULTIPLIER, 60)
+@local_bucket_limit(20, 60, key_func=token_key)
+@response_cache.cached(
+    timeout=60,
+    make_cache_key=simple_decode_cache_key,
+    # Only successful responses are cached, so invalid tokens are always rechecked
+    response_filter=lambda rv: isinstance(rv, Response) and rv.status_code == 200
+)
 def decode_video_url_simple():
     """
     Simple decode endpoint similar to external API
@@ -284,10 +802,10 @@ def decode_video_url_simple():
                 "error": "Token parameter is required"
             }), 400
         
-        logger.info(f"Simple decode request for URL: {video_url}")
+        logger.info("Simple decode request for URL: %s", video_url)
         
         # Validate token with ClassPlus
-        if not classplus_client.validate_token(token):
+        if not is_token_valid(token):
             return jsonify({
                 "status": "error",
                 "success": False,
@@ -303,11 +821,11 @@ def decode_video_url_simple():
             "url": playable_url
         }
         
-        logger.info(f"Successfully generated authenticated URL")
+        logger.info("Successfully generated authenticated URL")
         return jsonify(response_data)
         
     except Exception as e:
-        logger.error(f"Error in simple decode endpoint: {str(e)}")
+        logger.error("Error in simple decode endpoint: %s", e)
         return jsonify({
             "status": "error",
             "success": False,
@@ -315,56 +833,94 @@ def decode_video_url_simple():
         }), 500
 
 
-@app.route('/api/docs')
-def api_docs():
-    """API documentation"""
-    docs = {
-        "title": "ClassPlus Video URL Decoder API",
-        "version": "1.0.0",
-        "endpoints": {
-            "/api/decode": {
-                "method": "POST",
-                "description": "Decode a single encrypted video URL",
-                "payload": {
-                    "token": "string (required) - ClassPlus authentication token",
-                    "encrypted_url": "string (required) - Base64 encoded video URL",
-                    "video_id": "string (optional) - Video identifier"
-                },
-                "response": {
-                    "success": "boolean",
-                    "video_url": "string - Playable video URL",
-                    "decoded_url": "string - Decoded URL",
-                    "video_id": "string",
-                    "timestamp": "string"
-                }
+# The docs payload is static, so serialize it once at import
+API_DOCS = {
+    "title": "ClassPlus Video URL Decoder API",
+    "version": "1.0.0",
+    "endpoints": {
+        "/api/decode": {
+            "method": "POST",
+            "description": "Decode a single encrypted video URL",
+            "payload": {
+                "token": "string (required) - ClassPlus authentication token",
+                "encrypted_url": "string (required) - Base64 encoded video URL",
+                "video_id": "string (optional) - Video identifier"
             },
-            "/api/batch-decode": {
-                "method": "POST",
-                "description": "Decode multiple encrypted video URLs",
-                "payload": {
-                    "token": "string (required) - ClassPlus authentication token",
-                    "urls": "array (required) - Array of URL objects"
-                }
+            "response": {
+                "success": "boolean",
+                "video_url": "string - Playable video URL",
+                "decoded_url": "string - Decoded URL",
+                "video_id": "string",
+                "timestamp": "string"
+            }
+        },
+        "/api/batch-decode": {
+            "method": "POST",
+            "description": "Decode multiple encrypted video URLs",
+            "payload": {
+                "token": "string (required) - ClassPlus authentication token",
+                "urls": f"array (required) - Array of URL objects, at most {BATCH_MAX_URLS}"
             },
-            "/api/validate-token": {
-                "method": "POST",
-                "description": "Validate ClassPlus token",
-                "payload": {
-                    "token": "string (required) - ClassPlus authentication token"
-                }
+            "response": {
+                "content_type": "application/x-ndjson",
+                "lines": "One result object per URL in completion order, with index pointing into urls",
+                "last_line": "Summary object with done, total, successful and timestamp, or done with success false and code INTERNAL_ERROR if the stream failed"
             }
         },
-        "error_codes": {
-            "INVALID_JSON": "Request payload is not valid JSON",
-            "MISSING_TOKEN": "Authentication token is missing",
-            "MISSING_URL": "Encrypted URL is missing",
-            "INVALID_TOKEN": "Token is invalid or expired",
-            "DECODE_FAILED": "Failed to decode the encrypted URL",
-            "INTERNAL_ERROR": "Server internal error"
+        "/api/validate-token": {
+            "method": "POST",
+            "description": "Validate ClassPlus token",
+            "payload": {
+                "token": "string (required) - ClassPlus authentication token"
+            }
         }
+    },
+    "error_codes": {
+        "INVALID_JSON": "Request payload is not valid JSON",
+        "INVALID_PAYLOAD": "Request payload fields have the wrong type",
+        "MISSING_TOKEN": "Authentication token is missing",
+        "MISSING_URL": "Encrypted URL is missing",
+        "TOO_MANY_URLS": "Batch has more URLs than the server allows",
+        "INVALID_TOKEN": "Token is invalid or expired",
+        "DECODE_FAILED": "Failed to decode the encrypted URL",
+        "INTERNAL_ERROR": "Server internal error"
     }
+}
+
+API_DOCS_BYTES = orjson.dumps(API_DOCS)
+API_DOCS_ETAG = ckey(API_DOCS_BYTES).hex()
+API_DOCS_HEADERS = {
+    "Cache-Control": "public, max-age=3600",
+    "ETag": f'"{API_DOCS_ETAG}"'
+}
+
+@app.route('/api/docs')
+def api_docs():
+    """API documentation"""
+    if request.if_none_match.contains_weak(API_DOCS_ETAG):
+        return Response(status=304, headers=API_DOCS_HEADERS)
+    
+    return Response(API_DOCS_BYTES, mimetype="application/json", headers=API_DOCS_HEADERS)
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    """Token cache metrics"""
+    with token_cache_lock:
+        caches = {
+            name: {
+                "size": len(cache),
+                "maxsize": cache.maxsize,
+                "ttl": cache.ttl,
+                **token_cache_stats[name]
+            }
+            for name, cache in token_caches.items()
+        }
     
-    return jsonify(docs)
+    return jsonify({
+        "token_cache": caches,
+        "timestamp": decoder.get_timestamp()
+    })
 
 @app.errorhandler(429)
 def ratelimit_handler(e):
@@ -381,5 +937,5 @@ def not_found(e):
         "code": "NOT_FOUND"
     }), 404
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+if __name__ == '__main__' and os.environ.get("FLASK_DEV"):
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
@@ -1,4 +1,5 @@
+import os
 from app import app
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+if __name__ == '__main__' and os.environ.get("FLASK_DEV"):
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
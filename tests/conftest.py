@@ -0,0 +1,19 @@
+import sys
+import types
+
+try:
+    import utils.decoder
+    import utils.classplus_client
+except ImportError:
+    # The ClassPlus client modules aren't needed to exercise the limiters
+    utils = types.ModuleType("utils")
+    decoder = types.ModuleType("utils.decoder")
+    classplus_client = types.ModuleType("utils.classplus_client")
+    decoder.ClassPlusDecoder = type("ClassPlusDecoder", (), {})
+    classplus_client.ClassPlusClient = type("ClassPlusClient", (), {})
+    utils.decoder, utils.classplus_client = decoder, classplus_client
+    sys.modules.update({
+        "utils": utils,
+        "utils.decoder": decoder,
+        "utils.classplus_client": classplus_client
+    })
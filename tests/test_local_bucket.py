@@ -0,0 +1,83 @@
+import math
+import random
+import time
+
+import pytest
+from cachetools import TTLCache
+from werkzeug.exceptions import TooManyRequests
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+import app as m
+
+WORKERS = 4
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(m, "redis_client", client)
+    monkeypatch.setattr(m, "lease_grants_sha", client.script_load(m.LEASE_GRANTS_LUA))
+    monkeypatch.setattr(m, "local_buckets", TTLCache(maxsize=100, ttl=3600))
+    return client
+
+
+def run(view, requests, monkeypatch, workers=None, path="/"):
+    """Call view requests times, spreading calls over per-worker bucket caches"""
+    granted = 0
+    with m.app.test_request_context(path):
+        for _ in range(requests):
+            if workers:
+                monkeypatch.setattr(m, "local_buckets", random.choice(workers))
+            try:
+                view()
+                granted += 1
+            except TooManyRequests:
+                pass
+    return granted
+
+
+def test_workers_share_one_window(shared_redis, monkeypatch):
+    @m.local_bucket_limit(20, 60)
+    def view():
+        return "ok"
+    
+    workers = [TTLCache(maxsize=100, ttl=3600) for _ in range(WORKERS)]
+    assert run(view, 200, monkeypatch, workers) == 20
+
+
+def test_workers_never_overgrant_across_windows(shared_redis, monkeypatch):
+    limit, window_seconds, duration = 20, 0.5, 2.0
+    
+    @m.local_bucket_limit(limit, window_seconds)
+    def view():
+        return "ok"
+    
+    workers = [TTLCache(maxsize=100, ttl=3600) for _ in range(WORKERS)]
+    granted = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        granted += run(view, 10, monkeypatch, workers)
+        time.sleep(0.005)
+    
+    # A run can overlap one more window than it spans
+    assert granted <= limit * (math.ceil(duration / window_seconds) + 1)
+
+
+def test_missing_token_is_charged_once(shared_redis, monkeypatch):
+    @m.local_bucket_limit(5, 60)
+    @m.local_bucket_limit(5, 60, key_func=m.token_key)
+    def view():
+        return "ok"
+    
+    assert run(view, 10, monkeypatch) == 5
+
+
+def test_tokens_get_separate_buckets(shared_redis, monkeypatch):
+    @m.local_bucket_limit(5, 60, key_func=m.token_key)
+    def view():
+        return "ok"
+    
+    assert run(view, 10, monkeypatch, path="/?token=a") == 5
+    assert run(view, 10, monkeypatch, path="/?token=b") == 5
@@ -0,0 +1,6 @@
+# Patch the standard library before anything imports sockets, so requests
+# and redis calls yield to other greenlets under gunicorn's gevent workers.
+from gevent import monkey
+monkey.patch_all()
+
+from app import app